@@ -8,6 +8,7 @@ Core Battleship game logic:
 """
 
 import random
+import sys
 
 BOARD_SIZE = 10  # 10x10 grid
 SHIPS = [        # Tuple of (Ship Name, Ship Length)
@@ -18,6 +19,73 @@ SHIPS = [        # Tuple of (Ship Name, Ship Length)
     ("Destroyer", 2)
 ]
 
+# Cell values stored in the board grids (one byte per cell)
+EMPTY = ord('.')
+SHIP = ord('S')
+HIT = ord('X')
+MISS = ord('o')
+NO_SHIP = 0xFF  # ship_id_grid value for cells without a ship
+PLACEMENT_ATTEMPTS = 100  # Random draws per ship before place_ships_randomly lists every fit
+
+# fire_at lookup tables indexed by the hidden cell byte
+FIRE_MISS, FIRE_HIT, FIRE_ALREADY = 0, 1, 2
+_FIRE_ACTION = bytearray([FIRE_ALREADY]) * 256  # Unknown cells count as already shot
+_FIRE_ACTION[EMPTY] = FIRE_MISS
+_FIRE_ACTION[SHIP] = FIRE_HIT
+_FIRE_NEW_CELL = bytearray(range(256))  # Cell value after a shot (unchanged by default)
+_FIRE_NEW_CELL[EMPTY] = MISS
+_FIRE_NEW_CELL[SHIP] = HIT
+
+
+# === Grid Labels ===
+# Column headers and row letters only depend on the board size, so they are
+# built once per size and reused by every render.
+_GRID_LABELS = {}  # size -> {'console': str, 'online': str, 'show': str, 'rows': [str]}
+
+def _grid_labels(size):
+    """
+    Return the cached column headers and row letters for a board of this size.
+    """
+    labels = _GRID_LABELS.get(size)
+    if labels is None:
+        labels = {
+            'console': "  " + "".join(str(i + 1).rjust(2) for i in range(size)),
+            'online': "  " + " ".join(str(i + 1).rjust(2) for i in range(size)),
+            'show': "    " + "  ".join(str(i + 1).rjust(2) for i in range(size)),
+            'rows': [chr(ord('A') + r) for r in range(size)],
+        }
+        _GRID_LABELS[size] = labels
+    return labels
+
+_grid_labels(BOARD_SIZE)  # Standard board labels are built at import
+
+def _spaced_rows(grid, size, sep):
+    """
+    Split a flat grid into row strings with sep between cells.
+    The whole grid is decoded and joined once, then cut into rows by slicing.
+    """
+    text = sep.join(grid.decode())
+    stride = size * (len(sep) + 1)  # Row width plus the separator that follows it
+    width = stride - len(sep)
+    return [text[start:start + width] for start in range(0, len(text) + len(sep), stride)]
+
+# Cell count -> board size for every square board that has row letters
+_SQUARE_SIZES = {size * size: size for size in range(1, 27)}
+
+def render_board(cells):
+    """
+    Lay out a SHOW payload of size*size cell characters as a labelled grid.
+    Payloads that are not a square grid of at most 26 rows are returned unchanged.
+    """
+    size = _SQUARE_SIZES.get(len(cells))
+    if size is None:
+        return cells
+    labels = _grid_labels(size)
+    lines = [labels['show']]
+    for r, row_label in enumerate(labels['rows']):
+        lines.append(f"{row_label}   {'  '.join(cells[r * size:(r + 1) * size])}")
+    return "\n".join(lines) + "\n"
+
 
 class Board:
     """
@@ -26,31 +94,58 @@ class Board:
 
     def __init__(self, size=BOARD_SIZE):
         self.size = size
+        # Grids are flat bytearrays indexed by row * size + col
         # Hidden grid: true state (ships, hits, misses)
-        self.hidden_grid = [['.' for _ in range(size)] for _ in range(size)]
+        self.hidden_grid = bytearray(b'.' * (size * size))
         # Display grid: what the player sees (no ships)
-        self.display_grid = [['.' for _ in range(size)] for _ in range(size)]
-        # Track each ship's name and occupied positions
-        self.placed_ships = []  # [{'name': str, 'positions': set[(r,c)]}, ...]
+        self.display_grid = bytearray(b'.' * (size * size))
+        # Track each ship's name; its cells are found through ship_id_grid
+        self.placed_ships = []  # [{'name': str}, ...]
+        # Index into placed_ships for every cell (NO_SHIP if empty)
+        self.ship_id_grid = bytearray([NO_SHIP]) * (size * size)
+        # Unhit cells left per ship, parallel to placed_ships (one byte each)
+        self.ship_remaining = bytearray()
+        # Unhit ship cells left on the whole board
+        self.cells_remaining = 0
+        # Runs of empty cells by length, for the horizontal overlap test
+        self._empty_runs = [b'.' * n for n in range(size + 1)]
+        # Rendered boards by (show_hidden_board, header); cleared whenever a grid changes
+        self._render_cache = {}
 
     def place_ships_randomly(self, ships=SHIPS):
         """
         Randomly place each ship on the grid without overlaps.
+        Positions are drawn at random until one fits; if none of the draws fit,
+        the ship is placed uniformly among every position it fits in.
+        Each draw is one getrandbits value covering orientation, row and col;
+        values past the last position are thrown away so every position is equally likely.
         """
+        size = self.size
+        positions = 2 * size * size  # Both orientations of every cell
+        bits = (positions - 1).bit_length()
+        getrandbits = random.getrandbits
+        can_place_ship = self.can_place_ship
         for ship_name, ship_size in ships:
-            placed = False
-            while not placed:
-                orientation = random.randint(0, 1)  # 0 = horizontal, 1 = vertical
-                row = random.randint(0, self.size - 1)
-                col = random.randint(0, self.size - 1)
-
-                if self.can_place_ship(row, col, ship_size, orientation):
-                    occupied_positions = self.do_place_ship(row, col, ship_size, orientation)
-                    self.placed_ships.append({
-                        'name': ship_name,
-                        'positions': occupied_positions
-                    })
-                    placed = True
+            for _ in range(PLACEMENT_ATTEMPTS):
+                draw = getrandbits(bits)
+                if draw >= positions:
+                    continue
+                orientation = draw & 1  # 0 = horizontal, 1 = vertical
+                row, col = divmod(draw >> 1, size)
+                if can_place_ship(row, col, ship_size, orientation):
+                    break
+            else:  # Crowded board: list every fit once rather than retrying forever
+                candidates = [
+                    (row, col, orientation)
+                    for orientation in (0, 1)
+                    for row in range(size)
+                    for col in range(size)
+                    if can_place_ship(row, col, ship_size, orientation)
+                ]
+                if not candidates:
+                    raise ValueError(f"No room left to place {ship_name}")
+                row, col, orientation = random.choice(candidates)
+            self.do_place_ship(row, col, ship_size, orientation, ship_name)
 
     def place_ships_manually(self, ships=SHIPS):
         """
@@ -79,11 +174,7 @@ class Board:
                     continue
 
                 if self.can_place_ship(row, col, ship_size, orientation):
-                    occupied_positions = self.do_place_ship(row, col, ship_size, orientation)
-                    self.placed_ships.append({
-                        'name': ship_name,
-                        'positions': occupied_positions
-                    })
+                    self.do_place_ship(row, col, ship_size, orientation, ship_name)
                     break
                 else:
                     print(f"  [!] Cannot place {ship_name} at {coord_str} (orientation={orientation_str}). Try again.")
@@ -91,107 +182,150 @@ class Board:
     def can_place_ship(self, row, col, ship_size, orientation):
         """
         Checks if ship fits at location and doesn't overlap.
+        The ship's cells must match a run of empty cells of the same length.
         """
-        if orientation == 0:  # Horizontal
-            if col + ship_size > self.size:
+        size = self.size
+        if not (0 <= row < size and 0 <= col < size):
+            return False
+        idx = row * size + col
+        if orientation == 0:  # Horizontal: compared in place, no slice is made
+            if col + ship_size > size:
                 return False
-            for c in range(col, col + ship_size):
-                if self.hidden_grid[row][c] != '.':
-                    return False
-        else:  # Vertical
-            if row + ship_size > self.size:
+            return self.hidden_grid.startswith(self._empty_runs[ship_size], idx)
+        else:  # Vertical: one strided slice down the column
+            if row + ship_size > size:
                 return False
-            for r in range(row, row + ship_size):
-                if self.hidden_grid[r][col] != '.':
-                    return False
-        return True
+            return self.hidden_grid[idx:idx + ship_size * size:size] == self._empty_runs[ship_size]
 
-    def do_place_ship(self, row, col, ship_size, orientation):
+    def do_place_ship(self, row, col, ship_size, orientation, ship_name):
         """
-        Place ship on the board and return set of its coordinates.
+        Place ship on the board and record it in placed_ships.
         """
-        occupied = set()
-        if orientation == 0:
-            for c in range(col, col + ship_size):
-                self.hidden_grid[row][c] = 'S'
-                occupied.add((row, c))
-        else:
-            for r in range(row, row + ship_size):
-                self.hidden_grid[r][col] = 'S'
-                occupied.add((r, col))
-        return occupied
+        size = self.size
+        hidden_grid = self.hidden_grid
+        ship_id_grid = self.ship_id_grid
+        ship_id = len(self.placed_ships)
+        step = 1 if orientation == 0 else size  # Next cell along the ship
+        idx = row * size + col
+        for _ in range(ship_size):
+            hidden_grid[idx] = SHIP
+            ship_id_grid[idx] = ship_id
+            idx += step
+        self.placed_ships.append({'name': ship_name})
+        self.ship_remaining.append(ship_size)
+        self.cells_remaining += ship_size
+        self._render_cache.clear()
 
     def fire_at(self, row, col):
         """
         Fire at a location. Return result and ship sunk (if any).
         """
-        cell = self.hidden_grid[row][col]
-        if cell == 'S':
-            self.hidden_grid[row][col] = 'X'
-            self.display_grid[row][col] = 'X'
-            sunk_ship_name = self._mark_hit_and_check_sunk(row, col)
-            return ('hit', sunk_ship_name) if sunk_ship_name else ('hit', None)
-        elif cell == '.':
-            self.hidden_grid[row][col] = 'o'
-            self.display_grid[row][col] = 'o'
-            return ('miss', None)
-        elif cell in ('X', 'o'):
+        if not (0 <= row < self.size and 0 <= col < self.size):
+            raise ValueError("Coordinate out of range")
+        idx = row * self.size + col
+        cell = self.hidden_grid[idx]
+        action = _FIRE_ACTION[cell]
+        if action == FIRE_ALREADY:
             return ('already_shot', None)
-        return ('already_shot', None)  # Shouldn't happen
-
-    def _mark_hit_and_check_sunk(self, row, col):
+        new_cell = _FIRE_NEW_CELL[cell]  # 'X' for a ship, 'o' for water
+        self.hidden_grid[idx] = new_cell
+        self.display_grid[idx] = new_cell
+        self._render_cache.clear()
+        if action == FIRE_HIT:
+            return ('hit', self._mark_hit_and_check_sunk(idx))
+        return ('miss', None)
+
+    def _mark_hit_and_check_sunk(self, idx):
         """
-        Removes (row, col) from the hit ship's positions. If empty, return name.
+        Decrement the remaining cells of the ship at grid index idx. If none left, return its name.
         """
-        for ship in self.placed_ships:
-            if (row, col) in ship['positions']:
-                ship['positions'].remove((row, col))
-                if len(ship['positions']) == 0:
-                    return ship['name']
-                break
+        ship_id = self.ship_id_grid[idx]
+        self.ship_remaining[ship_id] -= 1
+        self.cells_remaining -= 1
+        if self.ship_remaining[ship_id] == 0:
+            return self.placed_ships[ship_id]['name']
         return None
 
     def all_ships_sunk(self):
         """
-        Return True if all ships have no remaining positions.
+        Return True if no ship has unhit cells left.
         """
-        return all(len(ship['positions']) == 0 for ship in self.placed_ships)
+        return self.cells_remaining == 0
 
     def print_display_grid(self, show_hidden_board=False):
         """
         Print the current visible state of the board.
         """
-        grid_to_print = self.hidden_grid if show_hidden_board else self.display_grid
-        print("  " + "".join(str(i + 1).rjust(2) for i in range(self.size)))
-        for r in range(self.size):
-            row_label = chr(ord('A') + r)
-            row_str = " ".join(grid_to_print[r][c] for c in range(self.size))
-            print(f"{row_label:2} {row_str}")
-
-    def render_display_grid(self):
+        self.write_display_grid(sys.stdout, show_hidden_board)
+
+    def write_display_grid(self, out, show_hidden_board=False, header='console'):
+        """
+        Write the board into a file-like object.
+        header selects the column header from _grid_labels ('console' or 'online').
+        The rendered text is cached until the next shot or placement.
+        """
+        key = (show_hidden_board, header)
+        text = self._render_cache.get(key)
+        if text is None:
+            grid_to_print = self.hidden_grid if show_hidden_board else self.display_grid
+            size = self.size
+            labels = _grid_labels(size)
+            lines = [labels[header]]
+            for row_label, row_str in zip(labels['rows'], _spaced_rows(grid_to_print, size, " ")):
+                lines.append(f"{row_label:2} {row_str}")
+            text = self._render_cache[key] = "\n".join(lines) + "\n"
+        out.write(text)
+
+    def display_cells(self):
         """
-        Return a string version of the board for sending to clients.
+        Return the display grid as size*size cell characters, row by row.
+        This fits in one packet; the client adds the labels when printing.
         """
-        header = "    " + "  ".join(f"{i+1:2}" for i in range(len(self.display_grid[0])))
-        rows = []
-        for r in range(len(self.display_grid)):
-            row_letter = chr(ord('A') + r)
-            row_str = "  ".join(f"{cell:1}" for cell in self.display_grid[r])
-            rows.append(f"{row_letter}   {row_str}")
-        return header + "\n" + "\n".join(rows) + "\n"
+        return self.display_grid.decode()
 
 
 # === Utility Function ===
+# ASCII byte -> row index for 'A'-'Z' / 'a'-'z'; 0xFF marks bytes that are not row letters
+_ROW_TABLE = bytearray([0xFF]) * 256
+for _i in range(26):
+    _ROW_TABLE[ord('A') + _i] = _i
+    _ROW_TABLE[ord('a') + _i] = _i
+_ROW_TABLE = bytes(_ROW_TABLE)
+del _i
+
+# Every coordinate on a standard board, upper and lower case -> (row, col)
+_COORDINATES = {}
+for _r in range(BOARD_SIZE):
+    for _c in range(BOARD_SIZE):
+        _COORDINATES[f"{chr(ord('A') + _r)}{_c + 1}"] = (_r, _c)
+        _COORDINATES[f"{chr(ord('a') + _r)}{_c + 1}"] = (_r, _c)
+del _r, _c
+
 def parse_coordinate(coord_str):
     """
     Convert "B5" to (1, 4). Raises ValueError on invalid input.
     """
-    coord_str = coord_str.strip().upper()
-    row_letter = coord_str[0]
-    col_digits = coord_str[1:]
-
-    row = ord(row_letter) - ord('A')
-    col = int(col_digits) - 1
+    coord = _COORDINATES.get(coord_str)  # Exact standard coordinates skip the parser
+    if coord is not None:
+        return coord
+    data = coord_str.strip().encode()
+    if len(data) < 2:
+        raise ValueError(f"Coordinate too short: {coord_str!r}")
+
+    row = _ROW_TABLE[data[0]]
+    if row == 0xFF:
+        raise ValueError(f"Invalid row letter: {coord_str!r}")
+
+    # Fold the column digits directly from the ASCII bytes
+    col = 0
+    for ch in data[1:]:
+        digit = ch - 48  # ord('0')
+        if not 0 <= digit <= 9:
+            raise ValueError(f"Invalid column number: {coord_str!r}")
+        col = col * 10 + digit
+    col -= 1
+    if col < 0:
+        raise ValueError(f"Invalid column number: {coord_str!r}")
     return (row, col)
 
 
@@ -243,23 +377,26 @@ def run_single_player_game_online(rfile, wfile):
     """
     Socket-compatible single-player game harness.
     For redirected input/output via rfile/wfile.
+    Output is written into wfile's buffer and flushed once per turn, right before reading input.
     """
     def send(msg):
         wfile.write(msg + '\n')
-        wfile.flush()
 
     def send_board(board):
         wfile.write("GRID\n")
-        wfile.write("  " + " ".join(str(i + 1).rjust(2) for i in range(board.size)) + '\n')
-        for r in range(board.size):
-            row_label = chr(ord('A') + r)
-            row_str = " ".join(board.display_grid[r][c] for c in range(board.size))
-            wfile.write(f"{row_label:2} {row_str}\n")
+        board.write_display_grid(wfile, header='online')
         wfile.write('\n')
+
+    def flush():
         wfile.flush()
 
+    # Iterating rfile reads from its buffer, so commands sent back-to-back
+    # are picked up without another read from the socket per line
+    lines = (line.strip() for line in rfile)
+
     def recv():
-        return rfile.readline().strip()
+        flush()  # Deliver everything queued this turn before blocking on input
+        return next(lines, None)  # None once the peer has closed the connection
 
     board = Board(BOARD_SIZE)
     board.place_ships_randomly(SHIPS)
@@ -270,8 +407,11 @@ def run_single_player_game_online(rfile, wfile):
         send_board(board)
         send("Enter coordinate to fire at (e.g. B5):")
         guess = recv()
+        if guess is None:
+            return
         if guess.lower() == 'quit':
             send("Thanks for playing. Goodbye.")
+            flush()
             return
 
         try:
@@ -287,6 +427,7 @@ def run_single_player_game_online(rfile, wfile):
                 if board.all_ships_sunk():
                     send_board(board)
                     send(f"Congratulations! You sank all ships in {moves} moves.")
+                    flush()
                     return
             elif result == 'miss':
                 send("MISS!")
@@ -1,11 +1,16 @@
 #client.py
 
 import socket       # For TCP/IP socket communication
-import threading    # For handling incoming messages concurrently
+import selectors    # For waiting on the server socket and keyboard input together
+import select       # For waiting on the server's reply after QUIT
 import zlib         # For CRC32 checksum to verify data integrity
-import sys          # For exiting on error or quit
-import time         # For brief delays before closing
+import struct       # For packing packet headers and CRCs
+import sys          # For reading keyboard input from stdin
+import os           # For unbuffered reads from stdin
+import threading    # For copying stdin to the loop where it can't be selected
+import time         # For the QUIT_WAIT deadline
 import re           # For coordinate input validation using regex
+from battleship import render_board  # Labels the raw cells of a SHOW reply
 
 # === Packet Types ===
 PACKET_TYPE_JOIN = 0x00    # Client joining the server
@@ -17,115 +22,266 @@ PACKET_TYPE_CHAT = 0x04    # Chat message between players
 PACKET_TYPE_PLACE = 0x05   # Place a ship on the board
 
 # === Packet Helpers ===
+# Precompiled header/CRC layouts, so each packet skips the format string lookup
+HEADER_STRUCT = struct.Struct('!BBB')  # [seq][type][length]
+CRC_STRUCT = struct.Struct('!I')       # Big-endian CRC32 after the payload
 
 def build_packet(seq, pkt_type, payload):
     data = payload.encode()  # Convert string to bytes
     if len(data) > 255:      # Limit payload size to 255 bytes
         print(f"[CLIENT ERROR] Payload too long: {len(data)} bytes")
         raise ValueError("Payload too long for packet format")
-    header = bytes([seq & 0xFF, pkt_type & 0xFF, len(data) & 0xFF]) + data
-    crc = zlib.crc32(header) & 0xFFFFFFFF     # Compute CRC32 over header+payload
-    packet = header + crc.to_bytes(4, 'big')  # Append CRC to form complete packet
-    return packet
+    header = HEADER_STRUCT.pack(seq & 0xFF, pkt_type & 0xFF, len(data)) + data
+    return header + CRC_STRUCT.pack(zlib.crc32(header))  # Append CRC32 of header+payload
+
+# Payload-free commands only vary by sequence number, so every frame is built once
+EMPTY_PACKETS = {
+    pkt_type: tuple(build_packet(seq, pkt_type, "") for seq in range(256))
+    for pkt_type in (PACKET_TYPE_QUIT, PACKET_TYPE_SHOW)
+}
 
 def parse_packet(data):
     try:
         if len(data) < 7:  # Minimum size for a valid packet
             return None, None, None
         seq, pkt_type, length = data[0], data[1], data[2]
-        payload = data[3:3+length]
-        if len(payload) < length:
+        end = 3 + length  # Header + payload; the CRC follows
+        if len(data) < end + 4:
             return None, None, None
-        crc_bytes = data[3+length:7+length]  # Extract CRC from packet
-        packet = data[:3+length]             # Extract packet without CRC
-        received_crc = int.from_bytes(crc_bytes, 'big')
-        calculated_crc = zlib.crc32(packet) & 0xFFFFFFFF
+        received_crc, = CRC_STRUCT.unpack_from(data, end)
+        calculated_crc = zlib.crc32(data[:end])  # data is a view into the receive buffer, so no copy
         if received_crc != calculated_crc:
             print(f"[CLIENT WARNING] CRC mismatch: received={received_crc}, calculated={calculated_crc}")
             return None, None, None
-        payload_str = payload.decode(errors='replace')  # Decode payload safely
+        payload_str = str(data[3:end], 'utf-8', 'replace')  # Decode payload safely
         return seq, pkt_type, payload_str
     except Exception as e:
         print(f"[CLIENT ERROR] Parsing packet: {e}")
         return None, None, None
 
-def receive_messages(sock):
-    buffer = b''            # Buffer for incomplete packet fragments
-    board_buffer = ''       # Temporary buffer for multi-part board payloads
-    awaiting_board = False  # State flag for board reconstruction
+# Packet types that are printed as a single tagged line
+MESSAGE_TAGS = {
+    PACKET_TYPE_CHAT: "[CHAT]",
+    PACKET_TYPE_FIRE: "[FIRE]",
+    PACKET_TYPE_ERROR: "[SERVER ERROR]",
+}
+
+RECV_BUFFER_SIZE = 65536  # Receive buffer size; one read can drain many queued packets
+MAX_PACKET_SIZE = 3 + 255 + 4  # Header + largest payload + CRC
+
+class ReceiveState:
+    """
+    Receive-side packet buffer kept between reads.
+    """
+    def __init__(self):
+        self.buffer = bytearray(RECV_BUFFER_SIZE)  # Reused buffer for incoming packet fragments
+        self.view = memoryview(self.buffer)        # Lets recv_into write after the bytes already held
+        self.read_off = 0                          # Start of the first unprocessed packet
+        self.filled = 0                            # End of the bytes received so far
+
+def receive_messages(sock, state):
+    """
+    Read once from the server and print every complete packet.
+    Returns False when the connection is over (closed, quit or error).
+    """
+    buffer = state.buffer
+    try:
+        received = sock.recv_into(state.view[state.filled:])  # Socket is readable, so this won't block
+        if not received:
+            print("[INFO] Connection closed by the server.")
+            return False
+        filled = state.filled + received
+        start = state.read_off  # Offset of the next unprocessed packet
+        while filled - start >= 7:
+            length = buffer[start + 2]  # Payload length
+            packet_size = 3 + length + 4  # Total size incl. header + CRC
+            if filled - start < packet_size:
+                break
+            packet_data = state.view[start:start + packet_size]  # No copy; parsed before the buffer is reused
+            start += packet_size
+            seq, pkt_type, payload = parse_packet(packet_data)
+            if seq is None:
+                continue  # Skip invalid packets
+            # Dispatch by packet type; plain messages take one table lookup
+            tag = MESSAGE_TAGS.get(pkt_type)
+            if tag is not None:
+                print(f"\n{tag} {payload}")
+            elif pkt_type == PACKET_TYPE_SHOW:
+                print("\n[BOARD]")
+                print(render_board(payload))
+            elif pkt_type == PACKET_TYPE_QUIT:
+                print(f"\n[QUIT] {payload}")
+                return False
+            else:
+                print(f"\n[UNKNOWN PACKET] Type: {pkt_type}, Payload: {payload}")
+        # Packets are consumed by advancing start; the unread tail is only moved
+        # back to the front once too little room is left for a full packet
+        if start == filled:
+            start = filled = 0
+        elif len(buffer) - filled < MAX_PACKET_SIZE:
+            buffer[:filled - start] = buffer[start:filled]
+            filled -= start
+            start = 0
+        state.read_off = start
+        state.filled = filled
+        return True
+    except OSError as e:  # Only socket failures end the session quietly
+        print(f"[CLIENT ERROR] Receiving: {e}")
+        return False
+
+# Valid coordinates: A-J followed by 1-10 (e.g., A1, B10, j7); compiled once at import
+COORDINATE_PATTERN = re.compile(r"[A-Ja-j](?:[1-9]|10)")
+
+def is_valid_coordinate(coord):
+    return COORDINATE_PATTERN.fullmatch(coord.strip()) is not None
+
+QUIT_WAIT = 0.5  # Longest wait (seconds) for the server to close after QUIT
 
+def wait_for_close(sock, state):
+    """
+    After QUIT, keep printing server packets until the server answers and
+    closes the connection, or QUIT_WAIT passes, instead of always sleeping.
+    """
+    deadline = time.monotonic() + QUIT_WAIT
     while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+            return
+        if not receive_messages(sock, state):  # QUIT reply, close or error
+            return
+
+def send_quit(sock, seq_counter, args):
+    try:
+        packet = EMPTY_PACKETS[PACKET_TYPE_QUIT][seq_counter]
+        sock.sendall(packet)  # main() then waits for the server's reply
+    except Exception as e:
+        print(f"[CLIENT ERROR] Failed to send quit: {e}")
+    return None
+
+def send_show(sock, seq_counter, args):
+    try:
+        packet = EMPTY_PACKETS[PACKET_TYPE_SHOW][seq_counter]
+        sock.sendall(packet)
+    except Exception as e:
+        print(f"[CLIENT ERROR] Failed to send show: {e}")
+    return (seq_counter + 1) & 0xFF
+
+def send_place(sock, seq_counter, args):
+    try:
+        packet = build_packet(seq_counter, PACKET_TYPE_PLACE, args)
+        sock.sendall(packet)
+    except Exception as e:
+        print(f"[CLIENT ERROR] Failed to send place: {e}")
+    return (seq_counter + 1) & 0xFF
+
+def send_fire(sock, seq_counter, args):
+    if not is_valid_coordinate(args):
+        print("[CLIENT ERROR] Invalid coordinate. Use A-J and 1-10, e.g. fire B7")
+        return seq_counter
+    try:
+        packet = build_packet(seq_counter, PACKET_TYPE_FIRE, args.upper())
+        sock.sendall(packet)
+    except Exception as e:
+        print(f"[CLIENT ERROR] Failed to send fire: {e}")
+    return (seq_counter + 1) & 0xFF
+
+def send_chat(sock, seq_counter, args):
+    if not args:
+        print("[CLIENT ERROR] Chat message cannot be empty.")
+        return seq_counter
+    try:
+        packet = build_packet(seq_counter, PACKET_TYPE_CHAT, args)
+        sock.sendall(packet)
+    except Exception as e:
+        print(f"[CLIENT ERROR] Failed to send chat: {e}")
+    return (seq_counter + 1) & 0xFF
+
+# Command word -> sender; each sender validates its own arguments and
+# returns the next sequence number (None once the player has quit)
+COMMAND_HANDLERS = {
+    'quit': send_quit,
+    'show': send_show,
+    'place': send_place,
+    'fire': send_fire,
+    'chat': send_chat,
+}
+COMMANDS_WITH_ARGS = {'place', 'fire', 'chat'}  # Need "<word> <args>"; quit and show must be typed alone
+
+def handle_command(sock, cmd, seq_counter):
+    """
+    Send the packet for one line of user input.
+    Returns the next sequence number, or None once the player has quit.
+    """
+    head, sep, rest = cmd.partition(' ')  # Command word is lowercased once, arguments keep their case
+    head = head.lower()
+    handler = COMMAND_HANDLERS.get(head)
+    if handler is None or bool(sep) != (head in COMMANDS_WITH_ARGS):  # e.g. 'quit now' or a bare 'place'
+        print("[CLIENT ERROR] Unknown command. Try: show, place <coord> <H/V> <ship_name>, fire <coord>, chat <msg>, quit")
+        return (seq_counter + 1) & 0xFF
+    return handler(sock, seq_counter, rest.strip())
+
+class KeyboardInput:
+    """
+    Keyboard bytes for the selector loop, split into lines.
+    stdin is watched directly where it can be selected; otherwise (Windows
+    consoles, or a regular file redirected to stdin) a reader thread copies
+    it into a socket pair that the selector can wait on.
+    """
+    def __init__(self, selector):
+        self.pending = b''  # Bytes read but not yet ended by a newline
+        fd = sys.stdin.fileno()
         try:
-            data = sock.recv(1024)  # Blocking receive from server
+            if sys.platform == 'win32':
+                raise OSError("console input can't be selected on Windows")
+            selector.register(fd, selectors.EVENT_READ, 'input')
+            self.read = lambda: os.read(fd, 1024)
+        except (ValueError, OSError):
+            inner, outer = socket.socketpair()
+            def pump():
+                with outer:  # Closing it passes stdin EOF on to the loop
+                    for data in iter(lambda: os.read(fd, 1024), b''):
+                        outer.sendall(data)
+            threading.Thread(target=pump, daemon=True).start()
+            selector.register(inner, selectors.EVENT_READ, 'input')
+            self.read = lambda: inner.recv(1024)
+
+    def readline(self):
+        """Block until a whole line (or EOF) has been typed; used before the loop starts."""
+        while b'\n' not in self.pending:
+            data = self.read()
             if not data:
-                print("[INFO] Connection closed by the server.")
                 break
-            buffer += data
-            while len(buffer) >= 7:
-                length = buffer[2]  # Payload length
-                packet_size = 3 + length + 4  # Total size incl. header + CRC
-                if len(buffer) < packet_size:
-                    break
-                packet_data = buffer[:packet_size]
-                buffer = buffer[packet_size:]
-                seq, pkt_type, payload = parse_packet(packet_data)
-                if seq is None:
-                    continue  # Skip invalid packets
-                # Dispatch by packet type
-                if pkt_type == PACKET_TYPE_CHAT:
-                    print(f"\n[CHAT] {payload}")
-                elif pkt_type == PACKET_TYPE_FIRE:
-                    print(f"\n[FIRE] {payload}")
-                elif pkt_type == PACKET_TYPE_SHOW:
-                    # Multi-part board rendering
-                    if payload.startswith("MORE\n"):
-                        if not awaiting_board:
-                            board_buffer = ''  # Start new multi-packet board
-                            awaiting_board = True
-                        board_buffer += payload[5:]  # Strip prefix
-                    elif payload.startswith("LAST\n"):
-                        if not awaiting_board:
-                            board_buffer = ''
-                        board_buffer += payload[5:]
-                        print("\n[BOARD]")
-                        print(board_buffer)
-                        board_buffer = ''
-                        awaiting_board = False
-                    else:
-                        # Legacy single-packet board
-                        print("\n[BOARD]")
-                        print(payload)
-                        board_buffer = ''
-                        awaiting_board = False
-                elif pkt_type == PACKET_TYPE_ERROR:
-                    print(f"\n[SERVER ERROR] {payload}")
-                elif pkt_type == PACKET_TYPE_QUIT:
-                    print(f"\n[QUIT] {payload}")
-                    sock.close()
-                    sys.exit(0)
-                else:
-                    print(f"\n[UNKNOWN PACKET] Type: {pkt_type}, Payload: {payload}")
-        except Exception as e:
-            print(f"[CLIENT ERROR] Receiving: {e}")
-            break
-    sock.close()
-    sys.exit(1)
+            self.pending += data
+        line, _, self.pending = self.pending.partition(b'\n')
+        return line.decode(errors='replace')
 
-def is_valid_coordinate(coord):
-    # Valid coordinates: A-J followed by 1-10 (e.g., A1, B10, j7)
-    match = re.fullmatch(r"([A-Ja-j])([1-9]|10)", coord.strip())
-    return bool(match)
+    def fill(self):
+        """Read what is ready; EOF on stdin counts as quit."""
+        data = self.read()
+        self.pending += data if data else b'quit\n'
+
+    def next_line(self):
+        """Return the next complete line, or None until more input arrives."""
+        if b'\n' not in self.pending:
+            return None
+        line, _, self.pending = self.pending.partition(b'\n')
+        return line.decode(errors='replace')
 
 def main():
     host = '127.0.0.1'   # Localhost for development
     port = 12345         # Server port to connect to
     seq_counter = 0      # Sequence number for packet tracking
 
+    # One event loop waits on both the server socket and the keyboard
+    selector = selectors.DefaultSelector()
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
         sock.connect((host, port))  # Establish TCP connection
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Send small packets immediately
         print("Connected to server.")
-        player_name = input("Enter your name: ").strip()
+        keyboard = KeyboardInput(selector)  # The name is read the same way as commands, so no input is lost
+        print("Enter your name: ", end="", flush=True)
+        player_name = keyboard.readline().strip()
         if not player_name:
             player_name = "Anonymous"
         join_packet = build_packet(seq_counter, PACKET_TYPE_JOIN, player_name)
@@ -133,10 +289,11 @@ def main():
         seq_counter = (seq_counter + 1) & 0xFF  # Wrap-around sequence number
     except Exception as e:
         print(f"[CLIENT ERROR] Could not connect to server: {e}")
+        selector.close()
         return
 
-    receiver = threading.Thread(target=receive_messages, args=(sock,), daemon=True)
-    receiver.start()  # Start listening to server messages in background
+    selector.register(sock, selectors.EVENT_READ, 'server')
+    receive_state = ReceiveState()
 
     print("\nCommands:")
     print("  show - Show your board")
@@ -144,69 +301,46 @@ def main():
     print("  fire <coord> - Fire at coordinate (e.g. fire A1)")
     print("  chat <message> - Send chat message")
     print("  quit - Exit the game")
+    print("> ", end="", flush=True)
 
-    while True:
+    running = True
+    while running:
         try:
-            cmd = input("> ").strip()
-            if not cmd:
-                continue
-            if cmd.lower() == 'quit':
-                try:
-                    packet = build_packet(seq_counter, PACKET_TYPE_QUIT, "")
-                    sock.sendall(packet)
-                    time.sleep(0.5)  # Allow time for quit packet to send
-                except Exception as e:
-                    print(f"[CLIENT ERROR] Failed to send quit: {e}")
-                break
-            elif cmd.lower() == 'show':
-                try:
-                    packet = build_packet(seq_counter, PACKET_TYPE_SHOW, "")
-                    sock.sendall(packet)
-                except Exception as e:
-                    print(f"[CLIENT ERROR] Failed to send show: {e}")
-            elif cmd.lower().startswith('place '):
-                try:
-                    packet = build_packet(seq_counter, PACKET_TYPE_PLACE, cmd[6:].strip())
-                    sock.sendall(packet)
-                except Exception as e:
-                    print(f"[CLIENT ERROR] Failed to send place: {e}")
-            elif cmd.lower().startswith('fire '):
-                target = cmd[5:].strip()
-                if not is_valid_coordinate(target):
-                    print("[CLIENT ERROR] Invalid coordinate. Use A-J and 1-10, e.g. fire B7")
-                    continue
-                try:
-                    packet = build_packet(seq_counter, PACKET_TYPE_FIRE, target.upper())
-                    sock.sendall(packet)
-                except Exception as e:
-                    print(f"[CLIENT ERROR] Failed to send fire: {e}")
-            elif cmd.lower().startswith('chat '):
-                message = cmd[5:].strip()
-                if not message:
-                    print("[CLIENT ERROR] Chat message cannot be empty.")
-                    continue
-                try:
-                    packet = build_packet(seq_counter, PACKET_TYPE_CHAT, message)
-                    sock.sendall(packet)
-                except Exception as e:
-                    print(f"[CLIENT ERROR] Failed to send chat: {e}")
-            else:
-                print("[CLIENT ERROR] Unknown command. Try: show, place <coord> <H/V> <ship_name>, fire <coord>, chat <msg>, quit")
-            seq_counter = (seq_counter + 1) & 0xFF
+            for key, _ in selector.select():
+                if key.data == 'server':
+                    running = receive_messages(sock, receive_state)
+                else:
+                    # Read raw bytes so lines typed or pasted together are all handled now
+                    keyboard.fill()
+                    while running:
+                        line = keyboard.next_line()
+                        if line is None:
+                            break
+                        cmd = line.strip()
+                        if cmd:
+                            seq_counter = handle_command(sock, cmd, seq_counter)
+                            running = seq_counter is not None
+                    if running:
+                        print("> ", end="", flush=True)
+                if not running:
+                    break
         except KeyboardInterrupt:
             print("\n[CLIENT INFO] Interrupted. Exiting.")
             try:
-                packet = build_packet(seq_counter, PACKET_TYPE_QUIT, "")
+                packet = EMPTY_PACKETS[PACKET_TYPE_QUIT][seq_counter]
                 sock.sendall(packet)
-                time.sleep(0.5)
+                wait_for_close(sock, receive_state)
             except Exception:
                 pass
             break
         except Exception as e:
             print(f"[CLIENT ERROR] {e}")
             break
+    if seq_counter is None:  # Left through the quit command
+        wait_for_close(sock, receive_state)
+    selector.close()
     sock.close()
     print("Disconnected.")
 
 if __name__ == '__main__':
-    main()  # Entry point for client execution
\ No newline at end of file
+    main()  # Entry point for client execution
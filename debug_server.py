@@ -3,13 +3,15 @@
 A debugging wrapper for server.py with added logging
 """
 
-import socket
-import threading
+import asyncio
+import contextlib
 import time
 import zlib
+import struct
 import sys
 import traceback
-from battleship import Board
+from itertools import chain
+from battleship import Board, parse_coordinate
 
 # === Constants ===
 HOST = '0.0.0.0'
@@ -26,54 +28,52 @@ PACKET_TYPE_ERROR = 0xFF
 PACKET_TYPE_CHAT = 0x04
 
 # === Packet Helpers ===
+HEADER_STRUCT = struct.Struct('!BBB')  # [seq][type][length]
+CRC_STRUCT = struct.Struct('!I')       # Big-endian CRC32 after the payload
+
 def build_packet(seq, pkt_type, payload):
     data = payload.encode()
-    if len(data) > 255:
-        print(f"[ERROR] Payload too long: {len(data)} bytes")
+    length = len(data)
+    if length > 255:
+        print(f"[ERROR] Payload too long: {length} bytes")
         raise ValueError("Payload too long for packet format")
-    header = bytes([seq & 0xFF, pkt_type & 0xFF, len(data) & 0xFF]) + data
-    crc = zlib.crc32(header) & 0xFFFFFFFF
-    packet = header + crc.to_bytes(4, 'big')
-    print(f"[DEBUG] Sending packet: type={pkt_type}, seq={seq}, len={len(data)}, payload={payload[:50]}...")
+    header = HEADER_STRUCT.pack(seq & 0xFF, pkt_type & 0xFF, length) + data
+    print(f"[DEBUG] Sending packet: type={pkt_type}, seq={seq}, len={length}, payload={payload[:50]}...")
+    return header + CRC_STRUCT.pack(zlib.crc32(header))
+
+# Frames for constant payloads, built once per (seq, type, payload)
+static_packets = {}
+
+def build_static_packet(seq, pkt_type, payload):
+    key = (seq & 0xFF, pkt_type, payload)
+    packet = static_packets.get(key)
+    if packet is None:
+        packet = static_packets[key] = build_packet(seq, pkt_type, payload)
+    else:
+        print(f"[DEBUG] Sending cached packet: type={pkt_type}, seq={seq}, payload={payload}")
     return packet
 
-# Helper to send a board in multiple packets if needed
-def send_board_in_chunks(conn, seq, board_str):
-    max_payload = 255 - 5  # Reserve 5 bytes for 'MORE\n' or 'LAST\n'
-    chunks = [board_str[i:i+max_payload] for i in range(0, len(board_str), max_payload)]
-    for i, chunk in enumerate(chunks):
-        is_last = (i == len(chunks) - 1)
-        prefix = 'LAST\n' if is_last else 'MORE\n'
-        payload = prefix + chunk
-        conn.sendall(build_packet(seq, PACKET_TYPE_SHOW, payload))
-        print(f"[DEBUG] Sent board chunk {i+1}/{len(chunks)} (is_last={is_last})")
-
-def parse_packet(sock):
+async def parse_packet(reader):
     try:
-        header = sock.recv(3)
-        if len(header) < 3:
-            print(f"[ERROR] Incomplete header: {len(header)} bytes received")
+        try:
+            header = await reader.readexactly(3)
+        except asyncio.IncompleteReadError as e:
+            print(f"[ERROR] Incomplete header: {len(e.partial)} bytes received")
             raise ValueError("Incomplete header")
             
         seq, pkt_type, length = header
         print(f"[DEBUG] Received header: seq={seq}, type={pkt_type}, length={length}")
         
-        payload = b''
-        while len(payload) < length:
-            chunk = sock.recv(length - len(payload))
-            if not chunk:
-                print(f"[ERROR] Incomplete payload: expected {length}, got {len(payload)}")
-                raise ValueError("Incomplete payload")
-            payload += chunk
-            
-        crc_bytes = sock.recv(4)
-        if len(crc_bytes) < 4:
-            print(f"[ERROR] Incomplete CRC: {len(crc_bytes)} bytes received")
-            raise ValueError("Incomplete CRC")
+        try:
+            body = await reader.readexactly(length + 4)  # Payload followed by CRC
+        except asyncio.IncompleteReadError as e:
+            print(f"[ERROR] Incomplete payload/CRC: expected {length + 4}, got {len(e.partial)}")
+            raise ValueError("Incomplete payload")
+        payload = body[:length]
+        crc_bytes = body[length:]
             
-        packet = header + payload
         received_crc = int.from_bytes(crc_bytes, 'big')
-        calculated_crc = zlib.crc32(packet) & 0xFFFFFFFF
+        calculated_crc = zlib.crc32(payload, zlib.crc32(header))
         
         if received_crc != calculated_crc:
             print(f"[ERROR] Checksum mismatch: received={received_crc}, calculated={calculated_crc}")
@@ -97,14 +97,13 @@ class GameState:
             print(f"[DEBUG] Placed ships for player {i+1} ({names[i]})")
         self.current_turn = 0
         self.names = names
-        self.spectators = spectators
-        self.lock = threading.Lock()
+        self.spectators = spectators  # Spectator writer -> name, as in server.py
         print(f"[INFO] Game initialized with players: {names}")
 
+    # Runs on the single event loop without awaiting, so the flip needs no lock
     def switch_turn(self):
-        with self.lock:
-            self.current_turn = 1 - self.current_turn
-            print(f"[INFO] Switched turn to player {self.current_turn+1} ({self.names[self.current_turn]})")
+        self.current_turn ^= 1
+        print(f"[INFO] Switched turn to player {self.current_turn+1} ({self.names[self.current_turn]})")
 
     def get_opponent_index(self, i):
         return 1 - i
@@ -113,19 +112,30 @@ class GameState:
 def broadcast_to_all(game, msg):
     packet = build_packet(0, PACKET_TYPE_CHAT, msg)
     print(f"[INFO] Broadcasting: {msg}")
-    for i, conn in enumerate(game.players + game.spectators):
-        try:
-            recipient = f"player {i+1}" if i < len(game.players) else f"spectator {i+1-len(game.players)}"
-            print(f"[DEBUG] Sending broadcast to {recipient}")
-            conn.sendall(packet)
-        except Exception as e:
-            print(f"[ERROR] Failed to send broadcast to recipient {i}: {e}")
+    for i, conn in enumerate(chain(game.players, game.spectators)):
+        recipient = f"player {i+1}" if i < len(game.players) else f"spectator {i+1-len(game.players)}"
+        if conn.is_closing():
+            print(f"[ERROR] Failed to send broadcast to {recipient}: connection closed")
             continue
+        print(f"[DEBUG] Sending broadcast to {recipient}")
+        conn.write(packet)
 
 # === Connection Handling ===
 reconnect_pool = {}
 
-def handle_player(player_idx, game):
+def hold_for_reconnect(name, entry):
+    reconnect_pool[name] = entry
+    asyncio.get_running_loop().call_later(RECONNECT_TIMEOUT, expire_reconnect, name, entry)
+
+def expire_reconnect(name, entry):
+    # Entries left after RECONNECT_TIMEOUT would otherwise keep the old game alive forever
+    if reconnect_pool.get(name) is entry:
+        del reconnect_pool[name]
+        print(f"[INFO] Reconnect window for {name} expired")
+
+# game.players holds each connection's StreamWriter (used as "conn");
+# the matching StreamReader is passed to the handler that owns it.
+async def handle_player(player_idx, game, reader):
     conn = game.players[player_idx]
     opp_idx = game.get_opponent_index(player_idx)
     board = game.boards[opp_idx]
@@ -135,29 +145,25 @@ def handle_player(player_idx, game):
     
     try:
         welcome_msg = f"Game started! You are playing against {game.names[opp_idx]}. Fire away."
-        conn.sendall(build_packet(0, PACKET_TYPE_CHAT, welcome_msg))
+        conn.write(build_packet(0, PACKET_TYPE_CHAT, welcome_msg))
         
         while True:
             try:
                 print(f"[DEBUG] Waiting for packet from player {player_idx+1} ({name})")
-                conn.settimeout(INACTIVITY_TIMEOUT)
-                seq, pkt_type, payload = parse_packet(conn)
+                seq, pkt_type, payload = await asyncio.wait_for(parse_packet(reader), INACTIVITY_TIMEOUT)
                 print(f"[INFO] Received packet from {name}: type={pkt_type}, payload={payload}")
 
                 if pkt_type == PACKET_TYPE_QUIT:
                     print(f"[INFO] Player {player_idx+1} ({name}) quit")
-                    conn.sendall(build_packet(seq, PACKET_TYPE_QUIT, "You quit."))
-                    game.players[opp_idx].sendall(build_packet(seq, PACKET_TYPE_CHAT, f"{name} quit. You win!"))
+                    conn.write(build_static_packet(seq, PACKET_TYPE_QUIT, "You quit."))
+                    game.players[opp_idx].write(build_packet(seq, PACKET_TYPE_CHAT, f"{name} quit. You win!"))
                     break
 
                 elif pkt_type == PACKET_TYPE_SHOW:
                     print(f"[INFO] Player {player_idx+1} ({name}) requested board")
-                    view = game.boards[player_idx].render_display_grid()
-                    # Use chunked sending if needed
-                    if len(view.encode()) > 255:
-                        send_board_in_chunks(conn, seq, view)
-                    else:
-                        conn.sendall(build_packet(seq, PACKET_TYPE_SHOW, view))
+                    # Raw cells fit in one packet; the client adds the labels
+                    cells = game.boards[player_idx].display_cells()
+                    conn.write(build_packet(seq, PACKET_TYPE_SHOW, cells))
 
                 elif pkt_type == PACKET_TYPE_CHAT:
                     print(f"[INFO] Chat from player {player_idx+1} ({name}): {payload}")
@@ -168,47 +174,64 @@ def handle_player(player_idx, game):
                     
                     if game.current_turn != player_idx:
                         print(f"[INFO] Not {name}'s turn (current turn: {game.names[game.current_turn]})")
-                        conn.sendall(build_packet(seq, PACKET_TYPE_ERROR, "Not your turn."))
+                        conn.write(build_static_packet(seq, PACKET_TYPE_ERROR, "Not your turn."))
                         continue
                         
+                    # parse_coordinate and fire_at report a bad coordinate with ValueError, the only
+                    # error that is the player's fault; anything else reaches the handler below
                     try:
-                        row = ord(payload[0].upper()) - ord('A')
-                        col = int(payload[1:]) - 1
+                        # Table-driven decode: no upper() copy or int() parse per shot
+                        row, col = parse_coordinate(payload)
                         print(f"[DEBUG] Parsed coordinates: row={row}, col={col}")
                         result, sunk = board.fire_at(row, col)
-                        print(f"[DEBUG] Fire result: {result}, sunk={sunk}")
-                        
-                        msg = f"{result.upper()} — Sunk {sunk}" if sunk else result.upper()
-                        conn.sendall(build_packet(seq, PACKET_TYPE_FIRE, f"RESULT {msg}"))
-                        game.players[opp_idx].sendall(build_packet(seq, PACKET_TYPE_FIRE, f"{name} fired at {payload}: {msg}"))
-                        broadcast_to_all(game, f"{name} fired at {payload}: {msg}")
-                        
-                        if result == 'hit' and board.all_ships_sunk():
-                            print(f"[INFO] Player {player_idx+1} ({name}) won!")
-                            conn.sendall(build_packet(seq, PACKET_TYPE_CHAT, "You win!"))
-                            game.players[opp_idx].sendall(build_packet(seq, PACKET_TYPE_CHAT, "You lose!"))
-                            break
-                        else:
-                            game.switch_turn()
-                    except Exception as e:
+                    except ValueError as e:
                         print(f"[ERROR] Error processing fire command: {e}")
-                        traceback.print_exc()
-                        conn.sendall(build_packet(seq, PACKET_TYPE_ERROR, f"Invalid FIRE format: {e}"))
+                        conn.write(build_packet(seq, PACKET_TYPE_ERROR, f"Invalid FIRE format: {e}"))
+                        continue
+                    print(f"[DEBUG] Fire result: {result}, sunk={sunk}")
+                    
+                    msg = f"{result.upper()} — Sunk {sunk}" if sunk else result.upper()
+                    won = result == 'hit' and board.all_ships_sunk()
+
+                    # Queue this shot's packets per player and send each batch in one write
+                    announcement = f"{name} fired at {payload}: {msg}"
+                    print(f"[INFO] Broadcasting: {announcement}")
+                    broadcast = build_packet(0, PACKET_TYPE_CHAT, announcement)
+                    shooter_packets = [build_packet(seq, PACKET_TYPE_FIRE, f"RESULT {msg}"), broadcast]
+                    opponent_packets = [build_packet(seq, PACKET_TYPE_FIRE, announcement), broadcast]
+                    if won:
+                        print(f"[INFO] Player {player_idx+1} ({name}) won!")
+                        shooter_packets.append(build_static_packet(seq, PACKET_TYPE_CHAT, "You win!"))
+                        opponent_packets.append(build_static_packet(seq, PACKET_TYPE_CHAT, "You lose!"))
+                    conn.writelines(shooter_packets)
+                    game.players[opp_idx].writelines(opponent_packets)
+                    print(f"[DEBUG] Sent {len(shooter_packets)} packets to player {player_idx+1}, {len(opponent_packets)} to player {opp_idx+1}")
+                    for i, spectator in enumerate(game.spectators):
+                        if spectator.is_closing():
+                            print(f"[ERROR] Failed to send broadcast to spectator {i+1}: connection closed")
+                            continue
+                        print(f"[DEBUG] Sending broadcast to spectator {i+1}")
+                        spectator.write(broadcast)
+
+                    if won:
+                        break
+                    else:
+                        game.switch_turn()
 
                 else:
                     print(f"[WARNING] Unknown packet type {pkt_type} from {name}")
-                    conn.sendall(build_packet(seq, PACKET_TYPE_ERROR, f"Unknown command (type {pkt_type})."))
+                    conn.write(build_packet(seq, PACKET_TYPE_ERROR, f"Unknown command (type {pkt_type})."))
 
-            except socket.timeout:
+            except asyncio.TimeoutError:
                 print(f"[INFO] Timeout from player {player_idx+1} ({name})")
-                conn.sendall(build_packet(0, PACKET_TYPE_ERROR, "Timeout. You forfeit your turn."))
-                game.players[opp_idx].sendall(build_packet(0, PACKET_TYPE_CHAT, f"{name} timed out."))
+                conn.write(build_static_packet(0, PACKET_TYPE_ERROR, "Timeout. You forfeit your turn."))
+                game.players[opp_idx].write(build_packet(0, PACKET_TYPE_CHAT, f"{name} timed out."))
                 game.switch_turn()
 
             except Exception as e:
                 print(f"[ERROR] Exception in player handler for {name}: {e}")
                 traceback.print_exc()
-                reconnect_pool[name] = (game.boards, opp_idx, game)
+                hold_for_reconnect(name, (game.boards, opp_idx, game))
                 print(f"[INFO] Added {name} to reconnect pool")
                 break
 
@@ -218,76 +241,83 @@ def handle_player(player_idx, game):
 
     print(f"[INFO] Player {player_idx+1} ({name}) handler ending, closing connection")
     conn.close()
+    with contextlib.suppress(OSError):  # wait_closed() raises if the peer reset the connection
+        await conn.wait_closed()
 
-def receive_name(conn):
+async def receive_name(reader, conn):
     try:
         print("[DEBUG] Waiting for JOIN packet")
-        seq, pkt_type, payload = parse_packet(conn)
+        seq, pkt_type, payload = await parse_packet(reader)
         if pkt_type == PACKET_TYPE_JOIN:
             name = payload.strip() or "Anonymous"
             print(f"[INFO] Received name '{name}'")
             return name
         else:
             print(f"[WARNING] Expected JOIN packet, got type {pkt_type}")
-            conn.sendall(build_packet(seq, PACKET_TYPE_ERROR, "Expected JOIN packet"))
+            conn.write(build_static_packet(seq, PACKET_TYPE_ERROR, "Expected JOIN packet"))
             return "Anonymous"
     except Exception as e:
         print(f"[ERROR] Error receiving name: {e}")
         traceback.print_exc()
         return "Anonymous"
 
-def lobby():
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    s.bind((HOST, PORT))
-    s.listen(5)
-    print(f"[SERVER] Listening on {HOST}:{PORT}")
-
-    waiting = []
+async def lobby():
+    waiting = []  # [(reader, writer), ...]
     names = []
+    handlers = set()  # Running handler tasks, kept referenced until they finish
 
-    while True:
-        print("[SERVER] Waiting for connection...")
-        conn, addr = s.accept()
+    def start_handler(player_idx, game, reader):
+        task = asyncio.ensure_future(handle_player(player_idx, game, reader))
+        handlers.add(task)
+        task.add_done_callback(handlers.discard)
+
+    async def accept(reader, conn):
+        nonlocal waiting, names
+        addr = conn.get_extra_info('peername')
         print(f"[SERVER] New connection from {addr}")
         
-        name = receive_name(conn)
+        name = await receive_name(reader, conn)
         print(f"[CONNECT] {name} from {addr}")
 
-        if name in reconnect_pool:
+        entry = reconnect_pool.pop(name, None)  # One lookup that also removes the entry
+        if entry is not None:
             print(f"[INFO] {name} is reconnecting")
-            boards, opponent_idx, old_game = reconnect_pool[name]
-            old_game.players[opponent_idx ^ 1] = conn
+            boards, opponent_idx, old_game = entry
+            my_idx = opponent_idx ^ 1
+            old_game.players[my_idx] = conn
             old_game.boards = boards
-            del reconnect_pool[name]
-            t = threading.Thread(target=handle_player, args=(opponent_idx ^ 1, old_game))
-            t.start()
-            continue
+            start_handler(my_idx, old_game, reader)
+            return
 
-        waiting.append(conn)
+        waiting.append((reader, conn))
         names.append(name)
         print(f"[INFO] Added {name} to waiting list. Current waiting: {len(waiting)}")
 
         if len(waiting) >= 2:
             print(f"[INFO] Starting game with {names[:2]}")
-            players = waiting[:2]
-            spectators = waiting[2:]
+            players = [writer for _, writer in waiting[:2]]
+            spectators = {writer: name for (_, writer), name in zip(waiting[2:], names[2:])}
             player_names = names[:2]
             game = GameState(players, spectators, player_names)
 
             for i in range(2):
-                players[i].sendall(build_packet(0, PACKET_TYPE_CHAT, f"You are Player {i+1} ({player_names[i]})"))
-            threading.Thread(target=handle_player, args=(0, game)).start()
-            threading.Thread(target=handle_player, args=(1, game)).start()
+                players[i].write(build_packet(0, PACKET_TYPE_CHAT, f"You are Player {i+1} ({player_names[i]})"))
+            start_handler(0, game, waiting[0][0])
+            start_handler(1, game, waiting[1][0])
 
             waiting = waiting[2:]
             names = names[2:]
             print(f"[INFO] Game started. Remaining in waiting: {len(waiting)}")
 
+    server = await asyncio.start_server(accept, HOST, PORT, reuse_address=True, backlog=5)
+    print(f"[SERVER] Listening on {HOST}:{PORT}")
+    async with server:
+        await server.serve_forever()
+
 if __name__ == '__main__':
     try:
-        lobby()
+        asyncio.run(lobby())
     except Exception as e:
         print(f"[FATAL] Unhandled exception in main thread: {e}")
         traceback.print_exc()
-        sys.exit(1) 
\ No newline at end of file
+        sys.exit(1)
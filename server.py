@@ -1,8 +1,10 @@
-import socket         # Networking for TCP connections
-import threading      # To handle multiple players at once
+import asyncio        # Single event loop serving every connection
+import contextlib     # For ignoring a peer reset while waiting for a stream to close
 import time           # Used for timeouts and delays
 import zlib           # For CRC32 checksum to verify packet integrity
-from battleship import Board                # Board logic (not shown here)
+import struct         # For packing packet headers and CRCs
+from itertools import chain  # Walk players and spectators without joining the lists
+from battleship import Board, parse_coordinate  # Board logic and the shared coordinate parser
 from ship_placement import ShipPlacement    # Manages player's ship placement
 
 # === Server Configuration ===
@@ -10,6 +12,7 @@ HOST = '0.0.0.0'                # Listen on all network interfaces
 PORT = 12345                   # Port the server listens on
 INACTIVITY_TIMEOUT = 30      # Time in seconds before disconnecting idle clients
 RECONNECT_TIMEOUT = 60        # Time window allowed for clients to reconnect
+LISTEN_BACKLOG = 1024         # Pending connections queued before SYNs are dropped (capped by somaxconn)
 
 # === Packet Type Constants (matches with client) ===
 PACKET_TYPE_JOIN = 0x00        # Initial handshake: joining the game
@@ -21,56 +24,47 @@ PACKET_TYPE_CHAT = 0x04        # Chat message
 PACKET_TYPE_PLACE = 0x05       # Player is placing a ship
 
 # === Helper: Build a binary packet to send over the wire ===
+HEADER_STRUCT = struct.Struct('!BBB')  # [seq][type][length]
+CRC_STRUCT = struct.Struct('!I')       # Big-endian CRC32 after the payload
+
 def build_packet(seq, pkt_type, payload):
     data = payload.encode()
     if len(data) > 255:  # Protocol only supports 1-byte length
         raise ValueError("Payload too long for packet format")
     # Packet = [seq, type, length] + payload + crc32
-    header = bytes([seq & 0xFF, pkt_type & 0xFF, len(data) & 0xFF]) + data
-    crc = zlib.crc32(header) & 0xFFFFFFFF
-    return header + crc.to_bytes(4, 'big')
-
-# === Helper: If board is too big for one packet, split it into chunks ===
-def send_board_in_chunks(conn, seq, board_str):
-    max_payload = 255 - 5  # Reserve 5 bytes for prefix (MORE\n/LAST\n)
-    chunks = [board_str[i:i+max_payload] for i in range(0, len(board_str), max_payload)]
-    for i, chunk in enumerate(chunks):
-        is_last = (i == len(chunks) - 1)
-        prefix = 'LAST\n' if is_last else 'MORE\n'
-        payload = prefix + chunk
-        conn.sendall(build_packet(seq, PACKET_TYPE_SHOW, payload))
-
-# === Helper: Read a full packet from a socket ===
-def parse_packet(sock):
+    header = HEADER_STRUCT.pack(seq & 0xFF, pkt_type & 0xFF, len(data)) + data
+    return header + CRC_STRUCT.pack(zlib.crc32(header))
+
+# === Helper: Frames for constant payloads, built once per (seq, type, payload) ===
+static_packets = {}
+
+def build_static_packet(seq, pkt_type, payload):
+    key = (seq & 0xFF, pkt_type, payload)
+    packet = static_packets.get(key)
+    if packet is None:
+        packet = static_packets[key] = build_packet(seq, pkt_type, payload)
+    return packet
+
+# === Helper: Read a full packet from a stream ===
+async def parse_packet(reader):
     try:
-        header = sock.recv(3)  # First 3 bytes: [seq, type, length]
-        if len(header) < 3:
-            raise ValueError("Incomplete header")
+        header = await reader.readexactly(3)  # First 3 bytes: [seq, type, length]
         seq, pkt_type, length = header
 
-        # Read the payload of specified length
-        payload = b''
-        while len(payload) < length:
-            chunk = sock.recv(length - len(payload))
-            if not chunk:
-                raise ValueError("Incomplete payload")
-            payload += chunk
-
-        # Read CRC checksum
-        crc_bytes = sock.recv(4)
-        if len(crc_bytes) < 4:
-            raise ValueError("Incomplete CRC")
-
-        # Validate CRC
-        packet = header + payload
+        # Read the payload of specified length followed by the CRC checksum
+        body = await reader.readexactly(length + 4)
+        payload = body[:length]
+        crc_bytes = body[length:]
+
+        # Validate CRC (chained over header then payload, no concatenation)
         received_crc = int.from_bytes(crc_bytes, 'big')
-        calculated_crc = zlib.crc32(packet) & 0xFFFFFFFF
+        calculated_crc = zlib.crc32(payload, zlib.crc32(header))
         if received_crc != calculated_crc:
             raise ValueError("Checksum mismatch")
 
         return seq, pkt_type, payload.decode()
-    except Exception as e:
-        raise e
+    except asyncio.IncompleteReadError:
+        raise ValueError("Incomplete packet")
 
 # === GameState: Keeps track of each match ===
 class GameState:
@@ -79,14 +73,13 @@ class GameState:
         self.placements = [ShipPlacement(), ShipPlacement()]  # One placement object per player
         self.current_turn = 0                       # 0 or 1, determines whose turn it is
         self.names = names                          # List of player names
-        self.spectators = spectators                # List of additional connected viewers (not used fully)
-        self.lock = threading.Lock()                # Lock for turn switching
+        self.spectators = spectators                # Spectator writer -> name, for viewers beyond the two players
         self.placement_phase = True                 # Phase flag: before game starts
         self.placement_complete = [False, False]    # Whether both players have placed all ships
 
+    # Handlers all run on one event loop and this never awaits, so no lock is needed
     def switch_turn(self):
-        with self.lock:
-            self.current_turn = 1 - self.current_turn  # Toggle turn between 0 and 1
+        self.current_turn ^= 1  # Toggle turn between 0 and 1
 
     def get_opponent_index(self, i):
         return 1 - i  # Return other player
@@ -98,27 +91,35 @@ class GameState:
         self.placement_phase = False
         broadcast_to_all(self, "Game started! Fire away.")  # Notify both players
 
-# === Broadcast a message to all connected sockets ===
+# === Broadcast a message to all connected streams ===
 def broadcast_to_all(game, msg):
-    packet = build_packet(0, PACKET_TYPE_CHAT, msg)
-    for conn in game.players + game.spectators:
-        try:
-            conn.sendall(packet)
-        except:
-            continue  # Ignore any sockets that are already disconnected
+    packet = build_packet(0, PACKET_TYPE_CHAT, msg)  # One bytes object shared by every recipient
+    for conn in chain(game.players, game.spectators):
+        if not conn.is_closing():  # Skip streams that are already disconnected
+            conn.write(packet)
 
 # === Reconnection logic support ===
 reconnect_pool = {}  # Stores reconnecting players: {name: (placements, idx, game)}
 
+def hold_for_reconnect(name, entry):
+    # Keep the player's slot for RECONNECT_TIMEOUT seconds, then drop it so
+    # abandoned games don't stay referenced by the pool forever
+    reconnect_pool[name] = entry
+    asyncio.get_running_loop().call_later(RECONNECT_TIMEOUT, expire_reconnect, name, entry)
+
+def expire_reconnect(name, entry):
+    if reconnect_pool.get(name) is entry:  # Not reconnected or replaced since
+        del reconnect_pool[name]
+
 # === Handle a single player's communication ===
-def handle_player(player_idx, game):
-    # If player_idx >= len(game.players), this is a spectator
-    is_spectator = player_idx >= len(game.players)
+# Connections are (reader, writer) stream pairs; game.players and game.spectators
+# hold the writers, used as "conn" below, and each handler owns its reader.
+async def handle_player(player_idx, game, reader, conn):
+    # player_idx is None for a spectator
+    is_spectator = player_idx is None
     if is_spectator:
-        conn = game.spectators[player_idx - len(game.players)]
-        name = game.names[player_idx]
+        name = game.spectators[conn]
     else:
-        conn = game.players[player_idx]
         opp_idx = game.get_opponent_index(player_idx)
         placement = game.placements[player_idx]
         name = game.names[player_idx]
@@ -131,37 +132,34 @@ def handle_player(player_idx, game):
                 "Available ships: Carrier(5), Battleship(4), Cruiser(3), Submarine(3), Destroyer(2)\n"
                 "Example: place A1 H Carrier"
             )
-            conn.sendall(build_packet(0, PACKET_TYPE_CHAT, welcome_msg))
+            conn.write(build_static_packet(0, PACKET_TYPE_CHAT, welcome_msg))
 
         # Main command loop for a player
         while True:
             try:
-                conn.settimeout(INACTIVITY_TIMEOUT)
-                seq, pkt_type, payload = parse_packet(conn)
+                seq, pkt_type, payload = await asyncio.wait_for(parse_packet(reader), INACTIVITY_TIMEOUT)
 
                 # === Handle Quit Command ===
                 if pkt_type == PACKET_TYPE_QUIT:
-                    conn.sendall(build_packet(seq, PACKET_TYPE_QUIT, "You quit."))
+                    conn.write(build_static_packet(seq, PACKET_TYPE_QUIT, "You quit."))
                     if not is_spectator:
-                        game.players[opp_idx].sendall(build_packet(seq, PACKET_TYPE_CHAT, f"{name} quit. You win!"))
+                        game.players[opp_idx].write(build_packet(seq, PACKET_TYPE_CHAT, f"{name} quit. You win!"))
                     break
 
                 # === Show Board Request ===
                 elif pkt_type == PACKET_TYPE_SHOW:
                     if not is_spectator:
-                        view = placement.get_board().render_display_grid()
-                        if len(view.encode()) > 255:
-                            send_board_in_chunks(conn, seq, view)
-                        else:
-                            conn.sendall(build_packet(seq, PACKET_TYPE_SHOW, view))
+                        # Raw cells fit in one packet; the client adds the labels
+                        cells = placement.get_board().display_cells()
+                        conn.write(build_packet(seq, PACKET_TYPE_SHOW, cells))
 
                 # === Place Ship ===
                 elif pkt_type == PACKET_TYPE_PLACE:
                     if is_spectator:
-                        conn.sendall(build_packet(seq, PACKET_TYPE_ERROR, "Spectators cannot place ships."))
+                        conn.write(build_static_packet(seq, PACKET_TYPE_ERROR, "Spectators cannot place ships."))
                         continue
                     if not game.placement_phase:
-                        conn.sendall(build_packet(seq, PACKET_TYPE_ERROR, "Placement phase is over."))
+                        conn.write(build_static_packet(seq, PACKET_TYPE_ERROR, "Placement phase is over."))
                         continue
                     try:
                         parts = payload.split()
@@ -170,16 +168,18 @@ def handle_player(player_idx, game):
                         coord, orientation, ship_name = parts
                         success, message = placement.place_ship(coord, orientation, ship_name)
                         if success:
-                            conn.sendall(build_packet(seq, PACKET_TYPE_CHAT, message))
-                            if placement.is_complete():
+                            replies = [build_packet(seq, PACKET_TYPE_CHAT, message)]
+                            complete = placement.is_complete()
+                            if complete:
                                 game.placement_complete[player_idx] = True
-                                conn.sendall(build_packet(seq, PACKET_TYPE_CHAT, "All ships placed! Waiting for opponent..."))
-                                if game.check_placement_complete():
-                                    game.start_game()
+                                replies.append(build_static_packet(seq, PACKET_TYPE_CHAT, "All ships placed! Waiting for opponent..."))
+                            conn.writelines(replies)  # Both replies in one send
+                            if complete and game.check_placement_complete():
+                                game.start_game()
                         else:
-                            conn.sendall(build_packet(seq, PACKET_TYPE_ERROR, message))
+                            conn.write(build_packet(seq, PACKET_TYPE_ERROR, message))
                     except Exception as e:
-                        conn.sendall(build_packet(seq, PACKET_TYPE_ERROR, f"Invalid placement: {str(e)}"))
+                        conn.write(build_packet(seq, PACKET_TYPE_ERROR, f"Invalid placement: {str(e)}"))
 
                 # === Chat ===
                 elif pkt_type == PACKET_TYPE_CHAT:
@@ -188,121 +188,140 @@ def handle_player(player_idx, game):
                 # === Fire at Opponent ===
                 elif pkt_type == PACKET_TYPE_FIRE:
                     if is_spectator:
-                        conn.sendall(build_packet(seq, PACKET_TYPE_ERROR, "Spectators cannot fire."))
+                        conn.write(build_static_packet(seq, PACKET_TYPE_ERROR, "Spectators cannot fire."))
                         continue
                     if game.placement_phase:
-                        conn.sendall(build_packet(seq, PACKET_TYPE_ERROR, "Game hasn't started yet. Place your ships first."))
+                        conn.write(build_static_packet(seq, PACKET_TYPE_ERROR, "Game hasn't started yet. Place your ships first."))
                         continue
+                    # parse_coordinate and fire_at report a bad coordinate with ValueError, the only
+                    # error that is the player's fault; anything else reaches the handler below
                     try:
-                        row = ord(payload[0].upper()) - ord('A')
-                        col = int(payload[1:]) - 1
+                        row, col = parse_coordinate(payload)
                         result, sunk = game.placements[opp_idx].get_board().fire_at(row, col)
-                        msg = f"{result.upper()} — Sunk {sunk}" if sunk else result.upper()
-
-                        # Notify both players and spectators of result
-                        conn.sendall(build_packet(seq, PACKET_TYPE_FIRE, f"RESULT {msg}"))
-                        game.players[opp_idx].sendall(build_packet(seq, PACKET_TYPE_FIRE, f"{name} fired at {payload}: {msg}"))
-                        broadcast_to_all(game, f"{name} fired at {payload}: {msg}")
-
-                        # Check for win condition
-                        if result == 'hit' and game.placements[opp_idx].get_board().all_ships_sunk():
-                            conn.sendall(build_packet(seq, PACKET_TYPE_CHAT, "You win!"))
-                            game.players[opp_idx].sendall(build_packet(seq, PACKET_TYPE_CHAT, "You lose!"))
-                            break
-                        else:
-                            game.switch_turn()
-                    except:
-                        conn.sendall(build_packet(seq, PACKET_TYPE_ERROR, "Invalid FIRE format."))
+                    except ValueError:
+                        conn.write(build_static_packet(seq, PACKET_TYPE_ERROR, "Invalid FIRE format."))
+                        continue
+                    msg = f"{result.upper()} — Sunk {sunk}" if sunk else result.upper()
+
+                    # Check for win condition
+                    won = result == 'hit' and game.placements[opp_idx].get_board().all_ships_sunk()
+
+                    # Notify both players and spectators of result; each player's
+                    # packets for this shot go out in one write
+                    fire_line = f"{name} fired at {payload}: {msg}"  # Formatted once for every recipient
+                    announcement = build_packet(0, PACKET_TYPE_CHAT, fire_line)
+                    shooter_packets = [build_packet(seq, PACKET_TYPE_FIRE, f"RESULT {msg}"), announcement]
+                    opponent_packets = [build_packet(seq, PACKET_TYPE_FIRE, fire_line), announcement]
+                    if won:
+                        shooter_packets.append(build_static_packet(seq, PACKET_TYPE_CHAT, "You win!"))
+                        opponent_packets.append(build_static_packet(seq, PACKET_TYPE_CHAT, "You lose!"))
+                    conn.writelines(shooter_packets)
+                    game.players[opp_idx].writelines(opponent_packets)
+                    for spectator in game.spectators:
+                        if not spectator.is_closing():
+                            spectator.write(announcement)
+
+                    if won:
+                        break
+                    else:
+                        game.switch_turn()
 
                 else:
-                    conn.sendall(build_packet(seq, PACKET_TYPE_ERROR, "Unknown command."))
+                    conn.write(build_static_packet(seq, PACKET_TYPE_ERROR, "Unknown command."))
 
-            except socket.timeout:
+            except asyncio.TimeoutError:
                 if not is_spectator:
-                    conn.sendall(build_packet(0, PACKET_TYPE_ERROR, "Timeout. You forfeit your turn."))
-                    game.players[opp_idx].sendall(build_packet(0, PACKET_TYPE_CHAT, f"{name} timed out."))
+                    conn.write(build_static_packet(0, PACKET_TYPE_ERROR, "Timeout. You forfeit your turn."))
+                    game.players[opp_idx].write(build_packet(0, PACKET_TYPE_CHAT, f"{name} timed out."))
                     game.switch_turn()
 
             except Exception as e:
                 if not is_spectator:
-                    reconnect_pool[name] = (game.placements, opp_idx, game)
+                    hold_for_reconnect(name, (game.placements, opp_idx, game))
                 break  # Leave handler, assume disconnect
 
     except Exception as outer:
         print(f"[ERROR] {name}: {outer}")
+    finally:
+        if is_spectator:
+            del game.spectators[conn]  # Keyed by writer, so no scan and no shifting slots
+        conn.close()
 
-    conn.close()
-    if is_spectator:
-        game.spectators.remove(conn)
-        game.names.remove(name)
+    with contextlib.suppress(OSError):  # A reset peer makes wait_closed() raise
+        await conn.wait_closed()
 
 # === Extract player name from JOIN packet ===
-def receive_name(conn):
+async def receive_name(reader, conn):
     try:
-        seq, pkt_type, payload = parse_packet(conn)
+        seq, pkt_type, payload = await parse_packet(reader)
         if pkt_type == PACKET_TYPE_JOIN:
             return payload.strip() or "Anonymous"
         else:
-            conn.sendall(build_packet(seq, PACKET_TYPE_ERROR, "Expected JOIN packet"))
+            conn.write(build_static_packet(seq, PACKET_TYPE_ERROR, "Expected JOIN packet"))
             return "Anonymous"
-    except:
+    except (ValueError, OSError):  # Bad/short JOIN or the client reset the connection
         return "Anonymous"
 
-# === Main Lobby Thread: Accept connections and pair up players ===
-def lobby():
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Prevent address already in use
-    s.bind((HOST, PORT))
-    s.listen()
-    print(f"[SERVER] Listening on {HOST}:{PORT}")
-
-    waiting = []  # Clients waiting to be paired
+# === Main Lobby: Accept connections and pair up players ===
+async def lobby():
+    waiting = []  # Clients waiting to be paired: [(reader, writer), ...]
     names = []
     current_game = None  # Track the current game
+    handlers = set()  # Running handler tasks, referenced so they are not garbage collected
+
+    def start_handler(player_idx, game, reader, conn):
+        task = asyncio.ensure_future(handle_player(player_idx, game, reader, conn))
+        handlers.add(task)
+        task.add_done_callback(handlers.discard)
 
-    while True:
-        conn, addr = s.accept()
-        name = receive_name(conn)
+    async def accept(reader, conn):
+        nonlocal current_game
+        addr = conn.get_extra_info('peername')
+        name = await receive_name(reader, conn)
         print(f"[CONNECT] {name} from {addr}")
 
-        # Reconnect player if found in reconnect pool
-        if name in reconnect_pool:
-            placements, opponent_idx, old_game = reconnect_pool[name]
-            old_game.players[opponent_idx ^ 1] = conn
+        # Reconnect player if found in reconnect pool (one lookup that also removes the entry)
+        entry = reconnect_pool.pop(name, None)
+        if entry is not None:
+            placements, opponent_idx, old_game = entry
+            my_idx = opponent_idx ^ 1
+            old_game.players[my_idx] = conn
             old_game.placements = placements
-            del reconnect_pool[name]
-            t = threading.Thread(target=handle_player, args=(opponent_idx ^ 1, old_game))
-            t.start()
-            continue
+            start_handler(my_idx, old_game, reader, conn)
+            return
 
         # If there's an active game, add new connection as spectator
         if current_game is not None:
-            current_game.spectators.append(conn)
-            current_game.names.append(name)
-            t = threading.Thread(target=handle_player, args=(len(current_game.players), current_game))
-            t.start()
-            continue
+            current_game.spectators[conn] = name
+            start_handler(None, current_game, reader, conn)
+            return
 
-        waiting.append(conn)
+        waiting.append((reader, conn))
         names.append(name)
 
         # When 2 players are ready, start a game
         if len(waiting) == 2:
-            players = waiting[:2]
+            players = [writer for _, writer in waiting]
             player_names = names[:2]
-            current_game = GameState(players, [], player_names)  # Initialize with empty spectators list
+            current_game = GameState(players, {}, player_names)  # Initialize with no spectators
 
             # Let each player know who they are
             for i in range(2):
-                players[i].sendall(build_packet(0, PACKET_TYPE_CHAT, f"You are Player {i+1} ({player_names[i]})"))
+                players[i].write(build_packet(0, PACKET_TYPE_CHAT, f"You are Player {i+1} ({player_names[i]})"))
 
-            threading.Thread(target=handle_player, args=(0, current_game)).start()
-            threading.Thread(target=handle_player, args=(1, current_game)).start()
+            start_handler(0, current_game, *waiting[0])
+            start_handler(1, current_game, *waiting[1])
 
             # Clear paired players from the queue
             waiting.clear()
             names.clear()
 
+    server = await asyncio.start_server(accept, HOST, PORT, reuse_address=True,  # Prevent address already in use
+                                        backlog=LISTEN_BACKLOG)
+    print(f"[SERVER] Listening on {HOST}:{PORT}")
+    async with server:
+        await server.serve_forever()
+
 # === Entry Point ===
 if __name__ == '__main__':
-    lobby()  # Start server and begin accepting clients
\ No newline at end of file
+    asyncio.run(lobby())  # Start server and begin accepting clients
\ No newline at end of file
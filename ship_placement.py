@@ -1,4 +1,7 @@
-from battleship import Board, SHIPS  # Import the game board class and list of ship definitions
+from battleship import Board, SHIPS, parse_coordinate  # Board class, ship definitions and the shared coordinate parser
+
+# Lowercased ship name -> (canonical name, size), so lookups are one case-insensitive dict probe
+SHIPS_BY_NAME = {name.lower(): (name, size) for name, size in SHIPS}
 
 class ShipPlacement:
     def __init__(self):
@@ -19,29 +22,25 @@ class ShipPlacement:
         """
 
         try:
-            # Look up the size of the ship using a case-insensitive match
-            ship_size = next((size for name, size in SHIPS if name.lower() == ship_name.lower()), None)
-            if ship_size is None:
+            # Look up the ship using a case-insensitive match
+            ship = SHIPS_BY_NAME.get(ship_name.lower())
+            if ship is None:
                 return False, f"Unknown ship: {ship_name}"  # Ship not in list
+            ship_name, ship_size = ship  # Canonical name from here on, so "carrier" and "Carrier" are the same ship
 
             # Prevent duplicate placement of the same ship
             if ship_name in self.placed_ships:
                 return False, f"{ship_name} already placed"
 
-            # Convert coordinate string to board indices
-            row = ord(coord[0].upper()) - ord('A')  # A-J → 0–9
-            col = int(coord[1:]) - 1                # 1–10 → 0–9
+            # Convert coordinate string to board indices (same parser and errors as FIRE)
+            row, col = parse_coordinate(coord)
 
             # Orientation: 0 = horizontal, 1 = vertical
-            orientation = 0 if orientation.upper() == 'H' else 1
+            orientation = 0 if orientation in ('H', 'h') else 1  # No upper() copy per packet
 
             # Validate and place the ship
             if self.board.can_place_ship(row, col, ship_size, orientation):
-                occupied = self.board.do_place_ship(row, col, ship_size, orientation)  # Returns occupied positions
-                self.board.placed_ships.append({      # Track the ship with name and positions
-                    'name': ship_name,
-                    'positions': occupied
-                })
+                self.board.do_place_ship(row, col, ship_size, orientation, ship_name)  # Also records the ship on the board
                 self.placed_ships.add(ship_name)      # Mark this ship as placed
                 return True, f"Placed {ship_name} at {coord}"
             else:
@@ -1,8 +1,13 @@
 import socket
 import threading
 import zlib
+import struct
 import sys
-import time
+import os
+from battleship import render_board
+
+# Per-packet [DEBUG] output is off unless BS_DEBUG is set in the environment
+DEBUG = bool(os.environ.get('BS_DEBUG'))
 
 # === Packet Types ===
 PACKET_TYPE_JOIN = 0x00
@@ -13,96 +18,115 @@ PACKET_TYPE_ERROR = 0xFF
 PACKET_TYPE_CHAT = 0x04
 
 # === Packet Helpers ===
+HEADER_STRUCT = struct.Struct('!BBB')  # [seq][type][length]
+CRC_STRUCT = struct.Struct('!I')       # Big-endian CRC32 after the payload
+
 def build_packet(seq, pkt_type, payload):
     data = payload.encode()
     if len(data) > 255:
         raise ValueError("Payload too long for packet format")
-    header = bytes([seq & 0xFF, pkt_type & 0xFF, len(data) & 0xFF]) + data
-    crc = zlib.crc32(header) & 0xFFFFFFFF
-    packet = header + crc.to_bytes(4, 'big')
-    print(f"[DEBUG] Sending packet: type={pkt_type}, seq={seq}, len={len(data)}, payload='{payload}'")
+    header = HEADER_STRUCT.pack(seq & 0xFF, pkt_type & 0xFF, len(data)) + data
+    packet = header + CRC_STRUCT.pack(zlib.crc32(header))
+    if DEBUG:
+        print(f"[DEBUG] Sending packet: type={pkt_type}, seq={seq}, len={len(data)}, payload='{payload}'")
     return packet
 
 def parse_packet(data):
     try:
         if len(data) < 7:  # Minimum packet size: 3 bytes header + 0 payload + 4 bytes CRC
-            print(f"[DEBUG] Packet too small: {len(data)} bytes")
+            if DEBUG:
+                print(f"[DEBUG] Packet too small: {len(data)} bytes")
             return None, None, None
         
         seq, pkt_type, length = data[0], data[1], data[2]
         payload = data[3:3+length]
         
         if len(payload) < length:
-            print(f"[DEBUG] Incomplete payload: got {len(payload)}, expected {length}")
+            if DEBUG:
+                print(f"[DEBUG] Incomplete payload: got {len(payload)}, expected {length}")
             return None, None, None
             
         crc_bytes = data[3+length:7+length]
-        packet = data[:3+length]
         received_crc = int.from_bytes(crc_bytes, 'big')
-        calculated_crc = zlib.crc32(packet) & 0xFFFFFFFF
+        calculated_crc = zlib.crc32(memoryview(data)[:3+length])  # CRC the header+payload in place
         
         if received_crc != calculated_crc:
             print(f"[WARNING] Checksum mismatch: received={received_crc}, calculated={calculated_crc}")
             return None, None, None
             
-        payload_str = payload.decode()
-        print(f"[DEBUG] Received packet: type={pkt_type}, seq={seq}, len={length}, payload='{payload_str}'")
+        payload_str = str(payload, 'utf-8')  # payload may be a view into the receive buffer
+        if DEBUG:
+            print(f"[DEBUG] Received packet: type={pkt_type}, seq={seq}, len={length}, payload='{payload_str}'")
         return seq, pkt_type, payload_str
     except Exception as e:
         print(f"[ERROR] Parsing packet: {e}")
-        print(f"[DEBUG] Raw data: {data.hex()}")
+        if DEBUG:
+            print(f"[DEBUG] Raw data: {data.hex()}")
         return None, None, None
 
+# Packet types that are printed as a single tagged line
+MESSAGE_TAGS = {
+    PACKET_TYPE_CHAT: "[CHAT]",
+    PACKET_TYPE_FIRE: "[FIRE]",
+    PACKET_TYPE_ERROR: "[ERROR]",
+}
+
 def receive_messages(sock):
-    buffer = b''
+    buffer = bytearray(4096)   # Reused receive buffer (larger than any packet)
+    view = memoryview(buffer)  # recv_into writes after the bytes already held
+    start = filled = 0         # Unprocessed bytes are buffer[start:filled]
     seq_counter = 0
     while True:
         try:
-            data = sock.recv(1024)
-            if not data:
+            received = sock.recv_into(view[filled:])
+            if not received:
                 print("Connection closed by the server.")
                 break
                 
-            print(f"[DEBUG] Received {len(data)} bytes from server")
-            buffer += data
+            if DEBUG:
+                print(f"[DEBUG] Received {received} bytes from server")
+            filled += received
             
             # Try to process as many complete packets as possible
-            while len(buffer) >= 7:  # Min packet size (3 byte header + 0 payload + 4 byte CRC)
-                length = buffer[2]
+            while filled - start >= 7:  # Min packet size (3 byte header + 0 payload + 4 byte CRC)
+                length = buffer[start + 2]
                 packet_size = 3 + length + 4  # header + payload + CRC
                 
-                if len(buffer) < packet_size:
-                    print(f"[DEBUG] Need more data: have {len(buffer)}, need {packet_size}")
+                if filled - start < packet_size:
+                    if DEBUG:
+                        print(f"[DEBUG] Need more data: have {filled - start}, need {packet_size}")
                     break  # Not enough data for a complete packet
                     
-                packet_data = buffer[:packet_size]
-                buffer = buffer[packet_size:]  # Remove processed packet
+                packet_data = view[start:start + packet_size]  # No copy; parsed before the buffer is reused
+                start += packet_size  # Consume processed packet
                 
                 seq, pkt_type, payload = parse_packet(packet_data)
                 if seq is None:
                     continue  # Invalid packet
                 
-                # Handle different packet types
-                if pkt_type == PACKET_TYPE_CHAT:
-                    print(f"\n[CHAT] {payload}")
-                elif pkt_type == PACKET_TYPE_FIRE:
-                    print(f"\n[FIRE] {payload}")
+                # Handle different packet types; plain messages take one table lookup
+                tag = MESSAGE_TAGS.get(pkt_type)
+                if tag is not None:
+                    print(f"\n{tag} {payload}")
                 elif pkt_type == PACKET_TYPE_SHOW:
                     print("\n[BOARD]")
-                    print(payload)
-                elif pkt_type == PACKET_TYPE_ERROR:
-                    print(f"\n[ERROR] {payload}")
+                    print(render_board(payload))
                 elif pkt_type == PACKET_TYPE_QUIT:
                     print(f"\n[QUIT] {payload}")
                     sock.close()
                     sys.exit(0)
                 else:
                     print(f"\n[UNKNOWN] Type: {pkt_type}, Payload: {payload}")
+
+            # Move any partial packet to the front so the next read has room
+            buffer[:filled - start] = buffer[start:filled]
+            filled -= start
+            start = 0
                 
         except ConnectionResetError:
             print("Connection lost.")
             break
-        except Exception as e:
+        except OSError as e:  # Socket closed under us or other socket errors; bugs still surface
             print(f"Error receiving: {e}")
             break
     
@@ -118,6 +142,7 @@ def main():
 
     try:
         sock.connect((host, port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Don't hold small packets back (Nagle)
         print("Connected to server.")
         
         # Send JOIN packet with player name
@@ -148,19 +173,20 @@ def main():
             
             if not cmd:
                 continue
+            command = cmd.lower()  # Lowercased once for all the checks below
                 
-            if cmd.lower() == 'quit':
+            if command == 'quit':
                 packet = build_packet(seq_counter, PACKET_TYPE_QUIT, "")
                 sock.sendall(packet)
-                # Wait briefly to allow the quit packet to be sent
-                time.sleep(0.5)
+                # Let the receiver print the server's reply; it ends as soon as the server closes
+                receiver.join(timeout=0.5)
                 break
                 
-            elif cmd.lower() == 'show':
+            elif command == 'show':
                 packet = build_packet(seq_counter, PACKET_TYPE_SHOW, "")
                 sock.sendall(packet)
                 
-            elif cmd.lower().startswith('fire '):
+            elif command.startswith('fire '):
                 target = cmd[5:].strip()
                 if len(target) >= 2:  # Basic validation (e.g., "A1")
                     packet = build_packet(seq_counter, PACKET_TYPE_FIRE, target)
@@ -168,7 +194,7 @@ def main():
                 else:
                     print("Invalid coordinate. Use format like 'fire A1'")
                     
-            elif cmd.lower().startswith('chat '):
+            elif command.startswith('chat '):
                 message = cmd[5:].strip()
                 if message:
                     packet = build_packet(seq_counter, PACKET_TYPE_CHAT, message)
@@ -183,7 +209,7 @@ def main():
             print("\nInterrupted. Exiting.")
             packet = build_packet(seq_counter, PACKET_TYPE_QUIT, "")
             sock.sendall(packet)
-            time.sleep(0.5)
+            receiver.join(timeout=0.5)
             break
         except Exception as e:
             print(f"Error: {e}")